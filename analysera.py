@@ -1,11 +1,17 @@
 import os
 import re
 
+import matning
+from extrgui import parse_tlut_directive, tlut_size
+from romfil import read_range, read_rom
+
 # Konfiguration
 CLEAN_FOLDER = r"C:\pajton\denna\clean"
 NTSC_ROM = r"C:\pajton\zeldantsc.z64"
 OUTPUT_REPORT = r"C:\pajton\bitmap_analysis.txt"
 OUTPUT_SETTINGS = r"C:\pajton\NTSC v1.0.txt"
+PAL_SETTINGS = r"C:\pajton\PAL v1.0.txt"
+PAL_ROM = r"C:\pajton\zeldapal.z64"
 
 def find_all_occurrences(rom_data, search_data):
     """Hitta alla förekomster av en bytesekvens i ROM:en"""
@@ -13,6 +19,7 @@ def find_all_occurrences(rom_data, search_data):
     start = 0
     while True:
         pos = rom_data.find(search_data, start)
+        matning.count('search_passes')
         if pos == -1:
             break
         occurrences.append(pos)
@@ -31,6 +38,7 @@ def parse_pal_settings(settings_file):
     current_format = ""
     current_width = 0
     current_height = 0
+    current_tlut = None
     
     with open(settings_file, 'r', encoding='utf-8') as f:
         for line in f:
@@ -47,6 +55,8 @@ def parse_pal_settings(settings_file):
             elif parts[0] == 'Set' and parts[1] == 'TexS':
                 size = parts[2].split('x')
                 current_width, current_height = int(size[0]), int(size[1])
+            elif parts[0] == 'Set' and parts[1] == 'Tlut':
+                current_tlut = parse_tlut_directive(parts)
             elif parts[0] == 'Exp':
                 current_format = parts[1]
                 address = parts[2]
@@ -57,28 +67,55 @@ def parse_pal_settings(settings_file):
                     'width': current_width,
                     'height': current_height,
                     'address': address,
-                    'name': name
+                    'name': name,
+                    'tlut': current_tlut
                 })
     
     return settings
 
-def main():
+def find_tluts(pal_settings, pal_rom, rom_data):
+    """
+    Söker paletterna från 'Set Tlut' i NTSC-ROM:en. Paletternas bytes läses
+    ur PAL-ROM:en, med så många poster som den största CI-texturen använder.
+    Returnerar (adress, format) -> lista med förekomster.
+    """
+    sizes = {}
+    for setting in pal_settings:
+        if setting['tlut'] is not None and setting['format'].upper() in ['CI4', 'CI8']:
+            count = tlut_size(setting['format'])
+            sizes[setting['tlut']] = max(sizes.get(setting['tlut'], 0), count)
+
+    tluts = {}
+    for (address, tlut_fmt), count in sizes.items():
+        if pal_rom is None or not os.path.exists(pal_rom):
+            tluts[(address, tlut_fmt)] = []
+            continue
+        tlut_data = read_range(pal_rom, address, count * 2)
+        with matning.stage('search'):
+            tluts[(address, tlut_fmt)] = find_all_occurrences(rom_data, tlut_data)
+    return tluts
+
+@matning.profiled
+def main(clean_folder=CLEAN_FOLDER, ntsc_rom=NTSC_ROM, output_report=OUTPUT_REPORT,
+         output_settings=OUTPUT_SETTINGS, pal_settings_path=PAL_SETTINGS, pal_rom=PAL_ROM):
     # Läs NTSC-romfilen
-    print(f"Läser NTSC-romfilen: {NTSC_ROM}")
-    with open(NTSC_ROM, 'rb') as f:
-        rom_data = f.read()
+    print(f"Läser NTSC-romfilen: {ntsc_rom}")
+    with matning.stage('rom_read'):
+        rom_data = read_rom(ntsc_rom)
+    matning.count('bytes_read', len(rom_data))
     print(f"Romstorlek: {len(rom_data)} bytes")
     
     # Samla in alla bitmap-filer från clean-mappen
-    print(f"\nSöker efter bitmap-filer i: {CLEAN_FOLDER}")
+    print(f"\nSöker efter bitmap-filer i: {clean_folder}")
     bitmap_files = {}
-    for root, dirs, files in os.walk(CLEAN_FOLDER):
+    for root, dirs, files in os.walk(clean_folder):
         for file in files:
             if file.endswith('.bin'):
                 file_path = os.path.join(root, file)
                 with open(file_path, 'rb') as f:
                     bitmap_data = f.read()
-                relative_path = os.path.relpath(file_path, CLEAN_FOLDER)
+                matning.count('bytes_read', len(bitmap_data))
+                relative_path = os.path.relpath(file_path, clean_folder)
                 bitmap_files[relative_path] = bitmap_data
     
     print(f"Hittade {len(bitmap_files)} bitmap-filer")
@@ -90,7 +127,8 @@ def main():
         name = extract_name_from_path(file_path)
         print(f"  [{i}/{len(bitmap_files)}] {name}...", end='', flush=True)
         
-        occurrences = find_all_occurrences(rom_data, bitmap_data)
+        with matning.stage('search'):
+            occurrences = find_all_occurrences(rom_data, bitmap_data)
         results[file_path] = {
             'name': name,
             'size': len(bitmap_data),
@@ -99,9 +137,15 @@ def main():
         }
         print(f" {len(occurrences)} förekomst(er)")
     
+    # Paletter (Set Tlut) söks på samma sätt, med data ur PAL-ROM:en
+    pal_settings = parse_pal_settings(pal_settings_path)
+    tluts = find_tluts(pal_settings, pal_rom, rom_data)
+    if tluts:
+        print(f"\nHittade {sum(1 for o in tluts.values() if o)} av {len(tluts)} paletter i NTSC-ROM:en")
+    
     # Skriv rapport
-    print(f"\nSkriver rapport till: {OUTPUT_REPORT}")
-    with open(OUTPUT_REPORT, 'w', encoding='utf-8') as f:
+    print(f"\nSkriver rapport till: {output_report}")
+    with open(output_report, 'w', encoding='utf-8') as f:
         f.write("=" * 80 + "\n")
         f.write("BITMAP-ANALYS FÖR NTSC-ROM\n")
         f.write("=" * 80 + "\n\n")
@@ -138,17 +182,27 @@ def main():
                 f.write("Status: SAKNAS I NTSC-ROM\n")
             
             f.write("\n")
+        
+        # Paletter
+        if tluts:
+            f.write("PALETTER (TLUT):\n\n")
+            for (address, tlut_fmt), occurrences in sorted(tluts.items()):
+                f.write(f"PAL-adress: 0x{address:X} ({tlut_fmt})\n")
+                if occurrences:
+                    f.write("Offsets: " + ", ".join(f"0x{offset:X}" for offset in occurrences[:5]) + "\n")
+                else:
+                    f.write("Status: SAKNAS I NTSC-ROM\n")
+                f.write("\n")
     
-    # Läs PAL-inställningar för struktur
+    # Skapa NTSC-inställningsfil med PAL-inställningarnas struktur
     print(f"\nSkapar NTSC-inställningsfil...")
-    pal_settings_path = r"C:\pajton\PAL v1.0.txt"
-    pal_settings = parse_pal_settings(pal_settings_path)
     
     # Skapa NTSC-inställningsfil
-    with open(OUTPUT_SETTINGS, 'w', encoding='utf-8') as f:
+    with open(output_settings, 'w', encoding='utf-8') as f:
         current_dir = ""
         current_format = ""
         current_size = ""
+        current_tlut = None
         
         for setting in pal_settings:
             # Är vi i en ny Dir?
@@ -163,6 +217,22 @@ def main():
                 current_format = setting['format']
                 f.write(f"Set TexS {current_size}\n")
             
+            # Är det en ny Set Tlut? Paletten flyttas till sin NTSC-adress
+            is_ci = setting['format'].upper() in ['CI4', 'CI8']
+            tlut_missing = is_ci and not tluts.get(setting['tlut'])
+            if is_ci and setting['tlut'] is not None and setting['tlut'] != current_tlut:
+                current_tlut = setting['tlut']
+                address, tlut_fmt = current_tlut
+                if tlut_missing:
+                    f.write(f"# Set Tlut XXXX {tlut_fmt} (PAL {address:X}, SAKNAS - SÖK MANUELLT)\n")
+                else:
+                    f.write(f"Set Tlut {tluts[current_tlut][0]:X} {tlut_fmt}\n")
+            
+            if tlut_missing:
+                # Utan palett skulle texturen bindas till fel Set Tlut
+                f.write(f"# Exp {setting['format']} XXXX {setting['name']} (PALETT SAKNAS)\n")
+                continue
+            
             # Hitta motsvarande bitmap i resultaten
             found = False
             for file_path, result in results.items():
@@ -177,10 +247,10 @@ def main():
                 # Kommentera ut saknade bitmap
                 f.write(f"# Exp {setting['format']} XXXX {setting['name']} (SAKNAS - SÖK MANUELLT)\n")
     
-    print(f"NTSC-inställningsfilen skapad: {OUTPUT_SETTINGS}")
+    print(f"NTSC-inställningsfilen skapad: {output_settings}")
     print("\nAnalys slutförd!")
-    print(f"\nRapport sparad: {OUTPUT_REPORT}")
-    print(f"Inställningsfil sparad: {OUTPUT_SETTINGS}")
+    print(f"\nRapport sparad: {output_report}")
+    print(f"Inställningsfil sparad: {output_settings}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
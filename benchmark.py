@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Codec-benchmark
+Mäter avkodning och kodning för alla N64-format över de texturstorlekar
+som förekommer i settings-filerna. Körs mot syntetisk data, ingen ROM behövs.
+Resultatet kan sparas som JSON och jämföras mellan commits.
+Med --e2e mäts extrahering, injektering och analys mot syntetiska ROM:ar
+i flera skalor.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import analysera
+from extrgui import (
+    decode_tlut,
+    decode_to_png_array_and_mode,
+    encode_from_png_array,
+    injection_pil_mode,
+    parse_settings_and_extract,
+    parse_settings_and_inject,
+    parse_settings_entries,
+    texture_byte_size,
+    tlut_size,
+)
+from syntetisk import generate_fixture
+
+FORMATS = ['I4', 'I8', 'IA4', 'IA8', 'IA16', 'RGBA16', 'RGBA32', 'CI4', 'CI8']
+
+
+def settings_files(folder='.'):
+    """Alla settings-filer i mappen (rom_config.txt räknas inte)"""
+    return sorted(
+        path for path in glob.glob(os.path.join(folder, '*.txt'))
+        if os.path.basename(path) != 'rom_config.txt'
+    )
+
+
+def texture_sizes(paths):
+    """Unika (bredd, höjd) från settings-filerna, minsta först"""
+    sizes = set()
+    for path in paths:
+        for entry in parse_settings_entries(path):
+            sizes.add((entry['width'], entry['height']))
+    return sorted(sizes, key=lambda size: (size[0] * size[1], size))
+
+
+def time_call(func, repeats):
+    """Kör func 'repeats' gånger och returnerar tiderna i sekunder"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_texture(fmt, width, height, repeats, rng):
+    """Mäter en kombination av format och storlek"""
+    size = texture_byte_size(fmt, width, height)
+    data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+    palette = None
+    if fmt in ['CI4', 'CI8']:
+        palette = decode_tlut(rng.integers(0, 256, tlut_size(fmt) * 2, dtype=np.uint8).tobytes())
+
+    arr, mode = decode_to_png_array_and_mode(data, width, height, fmt, palette)
+    # Samma konvertering som inject_image gör före kodning
+    img_array = np.array(Image.fromarray(arr, mode).convert(injection_pil_mode(fmt)))
+
+    decode_times = time_call(lambda: decode_to_png_array_and_mode(data, width, height, fmt, palette), repeats)
+    encode_times = time_call(lambda: encode_from_png_array(img_array, fmt, palette), repeats)
+
+    decode_s = statistics.median(decode_times)
+    encode_s = statistics.median(encode_times)
+    return {
+        'format': fmt,
+        'width': width,
+        'height': height,
+        'bytes': size,
+        'decode_ms': decode_s * 1000,
+        'encode_ms': encode_s * 1000,
+        'decode_mb_s': size / decode_s / 1e6 if decode_s else None,
+        'encode_mb_s': size / encode_s / 1e6 if encode_s else None,
+    }
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes, formats=FORMATS, repeats=5, seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    for fmt in formats:
+        for width, height in sizes:
+            result = bench_texture(fmt, width, height, repeats, rng)
+            results.append(result)
+            print(f"{fmt:7} {width:>3}x{height:<3} "
+                  f"avkodning {result['decode_ms']:8.3f} ms ({result['decode_mb_s']:7.3f} MB/s)  "
+                  f"kodning {result['encode_ms']:8.3f} ms ({result['encode_mb_s']:7.3f} MB/s)")
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'repeats': repeats,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def compare(old_report, new_report):
+    """Skriver ut hur mycket varje mätning ändrats mot en tidigare körning"""
+    old = {(r['format'], r['width'], r['height']): r for r in old_report['results']}
+    print(f"\nJämförelse mot {old_report.get('commit') or 'tidigare körning'} (faktor, >1 är snabbare):")
+    for result in new_report['results']:
+        before = old.get((result['format'], result['width'], result['height']))
+        if before is None:
+            continue
+        decode = before['decode_ms'] / result['decode_ms'] if result['decode_ms'] else float('inf')
+        encode = before['encode_ms'] / result['encode_ms'] if result['encode_ms'] else float('inf')
+        print(f"{result['format']:7} {result['width']:>3}x{result['height']:<3} "
+              f"avkodning {decode:6.2f}x  kodning {encode:6.2f}x")
+
+
+def timed_quietly(func, *args):
+    """Kör func utan dess per-textur-utskrifter och returnerar tiden i sekunder"""
+    start = time.perf_counter()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        func(*args)
+    return time.perf_counter() - start
+
+
+def run_e2e(settings_path, scales, seed=0):
+    """Extraherar, injicerar och analyserar en syntetisk ROM per skala"""
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            fixture = generate_fixture(settings_path, os.path.join(tmp, 'fixture'), scale=scale, seed=seed)
+            output = os.path.join(tmp, 'out')
+            stages = {
+                'extract': timed_quietly(parse_settings_and_extract, fixture['settings'], fixture['rom'], output),
+                'inject': timed_quietly(parse_settings_and_inject, fixture['settings'], fixture['rom'], output),
+                'analyse': timed_quietly(
+                    analysera.main, fixture['clean'], fixture['rom'],
+                    os.path.join(tmp, 'report.txt'), os.path.join(tmp, 'analysed.txt'), fixture['settings']),
+            }
+
+        result = {
+            'scale': scale,
+            'textures': fixture['textures'],
+            'texture_bytes': fixture['texture_bytes'],
+            'rom_size': fixture['rom_size'],
+        }
+        for stage, seconds in stages.items():
+            result[f'{stage}_s'] = seconds
+            result[f'{stage}_textures_s'] = fixture['textures'] / seconds if seconds else None
+            print(f"{scale:>4}x {stage:8} {fixture['textures']:6} texturer på {seconds:8.3f} s "
+                  f"({fixture['textures'] / seconds:9.1f} texturer/s)")
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mäter avkodning och kodning av N64-texturer")
+    parser.add_argument('--settings', nargs='*', help="settings-filer att hämta storlekar från (standard: alla)")
+    parser.add_argument('--format', nargs='*', default=FORMATS, help="format att mäta")
+    parser.add_argument('--upprepningar', type=int, default=5, help="antal körningar per mätning")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="spara resultatet som JSON")
+    parser.add_argument('--jamfor', help="jämför mot en tidigare sparad JSON")
+    parser.add_argument('--e2e', action='store_true', help="mät extrahering, injektering och analys end-to-end")
+    parser.add_argument('--e2e-settings', help="settings-fil för syntetisk ROM (standard: PAL v1.0.txt bredvid skriptet)")
+    parser.add_argument('--skalor', type=int, nargs='*', default=[1, 10, 100], help="skalor för --e2e")
+    args = parser.parse_args()
+
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    if args.e2e:
+        e2e_settings = args.e2e_settings or os.path.join(script_folder, 'PAL v1.0.txt')
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'seed': args.seed,
+            'e2e': run_e2e(e2e_settings, args.skalor, args.seed),
+        }
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"\nResultat sparat: {args.json}")
+        return
+
+    paths = args.settings or settings_files(script_folder)
+    sizes = texture_sizes(paths)
+    if not sizes:
+        print("❌ Fel: Inga texturstorlekar hittades i settings-filerna!")
+        sys.exit(1)
+
+    report = run_benchmark(sizes, [fmt.upper() for fmt in args.format], args.upprepningar, args.seed)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultat sparat: {args.json}")
+
+    if args.jamfor:
+        with open(args.jamfor, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
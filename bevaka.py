@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Bevakningsläge
+Övervakar PNG-filerna i utdatamappen, injicerar bara de bilder som ändrats
+och kör sedan omkomprimering via kompress.py
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from extrgui import parse_settings_entries, inject_image
+import kompress
+import matning
+
+# z64compress --cache: oförändrade filer behöver inte komprimeras om vid varje ändring
+CACHE_DIR = 'z64compress_cache'
+
+
+def build_manifest(settings_path, output_folder):
+    """Mappar varje PNG-sökväg till de Exp-poster som ska injiceras från den"""
+    manifest = {}
+    for entry in parse_settings_entries(settings_path):
+        png_path = os.path.join(output_folder, entry['dir'], f"{entry['name']}.png")
+        manifest.setdefault(png_path, []).append(entry)
+    return manifest
+
+
+def snapshot(paths):
+    """Returnerar (mtime, storlek) per befintlig fil"""
+    state = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        state[path] = (st.st_mtime_ns, st.st_size)
+    return state
+
+
+def changed_paths(old_state, new_state):
+    """Filer som är nya eller har ändrad mtime/storlek sedan förra pollningen"""
+    return [path for path, sig in new_state.items() if old_state.get(path) != sig]
+
+
+@matning.profiled
+def inject_changed(rom_file, manifest, paths, configs=None, cache_dir=CACHE_DIR, references=None):
+    """
+    Injicerar de ändrade bilderna och komprimerar om ROM:en. references är
+    retail-ROM:ar för --skip "auto", eftersom den injicerade ROM:en saknar
+    komprimeringsinformation.
+    """
+    start = time.perf_counter()
+    tlut_cache = {}
+    for path in sorted(paths):
+        for entry in manifest[path]:
+            inject_image(rom_file, path, entry['width'], entry['height'], entry['format'], entry['address'],
+                         entry['tlut'], tlut_cache)
+    injected = time.perf_counter() - start
+    print(f"✓ {len(paths)} bild(er) injicerade på {injected:.3f} s")
+
+    if configs:
+        kompress.compress_rom(rom_file, configs, cache_dir=cache_dir, references=references)
+        print(f"✓ Injektering och komprimering klar på {time.perf_counter() - start:.3f} s")
+
+
+def watch(settings_path, rom_file, output_folder, configs=None, interval=0.05, debounce=0.1, stop_event=None,
+          references=None):
+    """
+    Pollar mtime på alla PNG-filer i settings-filen. När ändringar har
+    lugnat sig i 'debounce' sekunder injiceras de och ROM:en komprimeras om.
+    Debounce räknas från filernas mtime, så en sparning som redan är
+    äldre än debounce injiceras i samma pollning som upptäcker den.
+    Fel vid injektering eller komprimering skrivs ut och bevakningen fortsätter.
+    """
+    manifest = build_manifest(settings_path, output_folder)
+    state = snapshot(manifest)
+    pending = set()
+    last_change = 0.0
+
+    print(f"Bevakar {len(state)} av {len(manifest)} PNG-filer i '{output_folder}'")
+    while stop_event is None or not stop_event.is_set():
+        time.sleep(interval)
+        current = snapshot(manifest)
+        changed = changed_paths(state, current)
+        state = current
+
+        if changed:
+            pending.update(changed)
+            last_change = max(last_change, max(current[path][0] for path in changed) / 1e9)
+
+        if pending and time.time() - last_change >= debounce:
+            try:
+                inject_changed(rom_file, manifest, pending, configs, references=references)
+            except Exception as e:
+                # Bakgrundstråden får inte dö tyst medan GUI:t visar att bevakningen pågår
+                print(f"❌ Fel i bevakningen: {e}")
+            pending.clear()
+
+
+def start_watch_thread(settings_path, rom_file, output_folder, compress=True, references=None):
+    """Startar bevakningen i en bakgrundstråd och returnerar ett stopp-Event"""
+    configs = kompress.load_config() if compress else None
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=watch,
+        args=(settings_path, rom_file, output_folder, configs),
+        kwargs={'stop_event': stop_event, 'references': references},
+        daemon=True,
+    )
+    thread.start()
+    return stop_event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Injicerar ändrade PNG-filer automatiskt och komprimerar om ROM:en")
+    parser.add_argument('settings', help="settings-fil, t.ex. 'PAL v1.0.txt'")
+    parser.add_argument('rom', help="ROM-fil som ska injiceras")
+    parser.add_argument('mapp', help="utdatamappen med PNG-filer")
+    parser.add_argument('--intervall', type=float, default=0.05, help="sekunder mellan pollningar")
+    parser.add_argument('--debounce', type=float, default=0.1, help="sekunder utan ändringar innan injektering")
+    parser.add_argument('--utan-kompress', action='store_true', help="hoppa över omkomprimering")
+    parser.add_argument('--referens', nargs='+', help="retail-ROM:ar för --skip \"auto\" i rom_config.txt")
+    matning.add_arguments(parser)
+    args = parser.parse_args()
+    matning.enable_from_args(args)
+
+    configs = None
+    if not args.utan_kompress:
+        configs = kompress.load_config()
+        if not configs:
+            sys.exit(1)
+
+    try:
+        watch(args.settings, args.rom, args.mapp, configs, args.intervall, args.debounce,
+              references=args.referens)
+    except KeyboardInterrupt:
+        print("\nBevakning avslutad.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
+import argparse
+import contextlib
+import io
 import os
+import queue
 import subprocess
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import ttk
+import threading
 from PIL import Image
 import numpy as np
 
+import matning
+from romfil import ROM_EXTENSIONS, read_range, write_range
+
 # ------------------------------------------------------------
 # Hjälpfunktioner för bitexpansion och nedskalning
 # ------------------------------------------------------------
@@ -41,12 +46,12 @@ def scale_8_to_5(value: int) -> int:
 # Avkodning N64 -> PNG-buffert enligt ZAPD-logiken
 # ------------------------------------------------------------
 
-def decode_to_png_array_and_mode(data: bytes, width: int, height: int, fmt: str):
+def decode_to_png_array_and_mode(data: bytes, width: int, height: int, fmt: str, palette=None):
     """
     Returnerar (numpy_array, mode_str) där mode_str är 'RGB' eller 'RGBA'
     och arrayen är i rätt form för Image.fromarray.
-    Stöder formaten: I4, I8, IA4, IA8, IA16, RGBA16, RGBA32.
-    'RGBA3' mappas till RGBA16.
+    Stöder formaten: I4, I8, IA4, IA8, IA16, RGBA16, RGBA32, CI4, CI8.
+    'RGBA3' mappas till RGBA16. CI-formaten kräver palette från decode_tlut.
     """
     format_norm = fmt.upper()
     if format_norm == 'RGBA3':
@@ -161,18 +166,96 @@ def decode_to_png_array_and_mode(data: bytes, width: int, height: int, fmt: str)
                 img[y, x, :] = [r, g, b, a]
         return img, 'RGBA'
 
+    elif format_norm in ['CI4', 'CI8']:
+        # Index till en palett (TLUT), 4 eller 8 bit per pixel
+        if palette is None:
+            raise ValueError(f"{format_norm} kräver en palett (Set Tlut)")
+        indices = ci_indices(data, format_norm, width * height)
+        return palette[indices.reshape(height, width)], 'RGBA'
+
     else:
         raise ValueError(f"Okänt eller ej implementerat format: {fmt}")
 
+# ------------------------------------------------------------
+# Paletter (TLUT) för CI4/CI8
+# ------------------------------------------------------------
+
+def tlut_size(fmt):
+    """Antal palettposter: 16 för CI4, 256 för CI8"""
+    return 16 if fmt.upper() == 'CI4' else 256
+
+def ci_indices(data: bytes, fmt: str, count: int) -> np.ndarray:
+    """Palettindex per pixel ur CI4/CI8-data, 2 index per byte för CI4"""
+    raw = np.frombuffer(data, dtype=np.uint8, count=texture_byte_size(fmt, count, 1))
+    if fmt.upper() != 'CI4':
+        return raw
+    indices = np.empty(raw.size * 2, dtype=np.uint8)
+    indices[0::2] = raw >> 4
+    indices[1::2] = raw & 0xF
+    return indices
+
+def decode_tlut(data: bytes, tlut_fmt: str = 'RGBA16') -> np.ndarray:
+    """Avkodar en TLUT (RGBA16 eller IA16) till en (n, 4) RGBA-array"""
+    if tlut_fmt.upper() not in ['RGBA16', 'IA16']:
+        raise ValueError(f"Okänt TLUT-format: {tlut_fmt}")
+    arr, _ = decode_to_png_array_and_mode(data, len(data) // 2, 1, tlut_fmt)
+    return arr[0]
+
+def match_palette(rgba: np.ndarray, palette: np.ndarray, current=None) -> np.ndarray:
+    """
+    Palettindex per pixel. Exakta träffar slås upp via searchsorted på
+    packade RGBA-värden, övriga får närmaste färg i paletten.
+    current är ROM:ens nuvarande index. Pixlar vars färg redan stämmer med
+    sitt index behåller det, så att dubblettfärger i paletten inte ändrar
+    bytes i en bild som inte redigerats.
+    """
+    pixels = np.ascontiguousarray(rgba.reshape(-1, 4), dtype=np.uint8)
+    keys = pixels.view('>u4').ravel()
+    palette_values = np.ascontiguousarray(palette).view('>u4').ravel()
+    palette_keys, first = np.unique(palette_values, return_index=True)
+
+    pos = np.searchsorted(palette_keys, keys).clip(max=len(palette_keys) - 1)
+    indices = first[pos]
+
+    missing = np.flatnonzero(palette_keys[pos] != keys)
+    pal = palette.astype(np.int32)
+    for start in range(0, missing.size, 4096):
+        chunk = missing[start:start + 4096]
+        diff = pixels[chunk, None, :].astype(np.int32) - pal[None, :, :]
+        indices[chunk] = np.argmin((diff * diff).sum(axis=2), axis=1)
+
+    if current is not None:
+        indices = np.where(palette_values[current] == keys, current, indices)
+    return indices.astype(np.uint8)
+
+def load_tlut(filename, address, count, tlut_fmt='RGBA16', cache=None, rom=None):
+    """
+    Läser och avkodar en TLUT. Med en cache-dict avkodas varje palett
+    bara en gång per körning även om många texturer delar den.
+    rom är en öppen RomView för filename, så läses paletten ur den i stället
+    för att filen öppnas och byteordningen avgörs på nytt.
+    """
+    key = (filename, address, count, tlut_fmt.upper())
+    if cache is not None and key in cache:
+        return cache[key]
+    with matning.stage('tlut'):
+        data = rom.read(address, count * 2) if rom is not None else read_range(filename, address, count * 2)
+        palette = decode_tlut(data, tlut_fmt)
+    matning.count('tluts_decoded')
+    if cache is not None:
+        cache[key] = palette
+    return palette
+
 # ------------------------------------------------------------
 # Kodning PNG-buffert -> N64 enligt ZAPD-logiken
 # ------------------------------------------------------------
 
-def encode_from_png_array(img_array: np.ndarray, fmt: str) -> bytearray:
+def encode_from_png_array(img_array: np.ndarray, fmt: str, palette=None, current=None) -> bytearray:
     """
     img_array är en numpy-array från en redan konverterad PIL-bild i rätt mode.
-    fmt stöder: I4, I8, IA4, IA8, IA16, RGBA16, RGBA32.
-    'RGBA3' mappas till RGBA16.
+    fmt stöder: I4, I8, IA4, IA8, IA16, RGBA16, RGBA32, CI4, CI8.
+    'RGBA3' mappas till RGBA16. CI-formaten kräver palette från decode_tlut,
+    och current (ROM:ens nuvarande bytes) behåller index vid dubblettfärger.
     """
     format_norm = fmt.upper()
     if format_norm == 'RGBA3':
@@ -344,21 +427,100 @@ def encode_from_png_array(img_array: np.ndarray, fmt: str) -> bytearray:
                 out.append(int(a[y, x]) & 0xFF)
         return out
 
+    elif format_norm in ['CI4', 'CI8']:
+        # Närmaste palettindex per pixel, 2 index per byte för CI4
+        if palette is None:
+            raise ValueError(f"{format_norm} kräver en palett (Set Tlut)")
+        if img_array.ndim != 3 or img_array.shape[2] != 4:
+            raise ValueError(f"Oväntat bildformat vid {format_norm}-kodning")
+        if current is not None:
+            current = ci_indices(current, format_norm, img_array.shape[0] * img_array.shape[1])
+        indices = match_palette(img_array, palette, current)
+        if format_norm == 'CI4':
+            indices = (indices[0::2] << 4) | (indices[1::2] & 0xF)
+        out.extend(indices.tobytes())
+        return out
+
     else:
         raise ValueError(f"Okänt eller ej implementerat format: {fmt}")
 
+# ------------------------------------------------------------
+# Skrivtrådar för extraheringens utdata
+# ------------------------------------------------------------
+
+class FileWriterPool:
+    """
+    Skriver färdiga filer från en begränsad kö med flera trådar, så att
+    avkodning och PNG-kodning inte väntar på disken. submit blockerar när
+    kön är full, vilket håller minnesanvändningen begränsad. Varje mapp
+    skapas bara en gång.
+    """
+
+    def __init__(self, workers=4, max_pending=64):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.errors = []
+        self._created_dirs = set()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, path, data):
+        self.queue.put((path, data))
+
+    def _ensure_dir(self, folder):
+        with self._lock:
+            if folder in self._created_dirs:
+                return
+            os.makedirs(folder, exist_ok=True)
+            self._created_dirs.add(folder)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            path, data = job
+            try:
+                self._ensure_dir(os.path.dirname(path))
+                with matning.stage('write_file'), open(path, 'wb') as f:
+                    f.write(data)
+            except Exception as e:
+                # En död tråd skulle låta submit blockera för evigt när kön är full
+                with self._lock:
+                    self.errors.append((path, e))
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        """Väntar tills kön är tom och stänger trådarna. Skrivfelen finns kvar i errors"""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for path, e in self.errors:
+            print(f"Fel vid skrivning av '{path}': {e}")
+
 # ------------------------------------------------------------
 # Wrapper-funktioner för att läsa, spara PNG och skriva tillbaka
 # ------------------------------------------------------------
 
-def extract_and_convert(filename, output_folder, width, height, fmt, address, name, subfolder=''):
+def texture_byte_size(fmt, width, height):
+    """Antal byte rådata en textur i formatet fmt upptar i ROM:en"""
     # Bytes per pixel enligt N64-rådata
     fmt_norm = fmt.upper()
     if fmt_norm == 'RGBA3':
         fmt_norm = 'RGBA16'
-    if fmt_norm in ['I4', 'IA4']:
+    if fmt_norm in ['I4', 'IA4', 'CI4']:
         bpp = 0.5
-    elif fmt_norm in ['I8', 'IA8']:
+    elif fmt_norm in ['I8', 'IA8', 'CI8']:
         bpp = 1
     elif fmt_norm in ['IA16', 'RGBA16']:
         bpp = 2
@@ -366,107 +528,201 @@ def extract_and_convert(filename, output_folder, width, height, fmt, address, na
         bpp = 4
     else:
         raise ValueError(f"Okänt format: {fmt}")
+    return int(width * height * bpp)
 
-    total_bytes = int(width * height * bpp)
+def injection_pil_mode(fmt):
+    """PIL-mode som bilden konverteras till före kodning"""
+    fmt_norm = fmt.upper()
+    if fmt_norm == 'RGBA3':
+        fmt_norm = 'RGBA16'
+    if fmt_norm in ['I4', 'I8']:
+        return 'L'         # gråskala utan alfa
+    elif fmt_norm in ['IA4', 'IA8', 'IA16']:
+        return 'LA'        # gråskala med alfa
+    elif fmt_norm in ['RGBA16', 'RGBA32', 'CI4', 'CI8']:
+        return 'RGBA'      # färg med alfa
+    raise ValueError(f"Okänt format: {fmt}")
+
+def compact_png_array_and_mode(arr, mode, fmt):
+    """
+    Minsta förlustfria PIL-mode per format: I4/I8 som 'L' och IA4/IA8/IA16
+    som 'LA'. Övriga format lämnas som de är. inject_image läser tillbaka
+    dem till samma bytes.
+    """
+    fmt_norm = fmt.upper()
+    if fmt_norm in ['I4', 'I8']:
+        return np.ascontiguousarray(arr[:, :, 0]), 'L'
+    elif fmt_norm in ['IA4', 'IA8', 'IA16']:
+        return np.ascontiguousarray(arr[:, :, [0, 3]]), 'LA'
+    return arr, mode
+
+def extract_and_convert(filename, output_folder, width, height, fmt, address, name, subfolder='',
+                        compact=False, compress_level=None, tlut=None, tlut_cache=None, writer=None):
+    """
+    compact sparar I- och IA-format som 'L'/'LA' i stället för RGB/RGBA.
+    compress_level (0-9) styr zlib-nivån för PNG, None ger PIL:s standard.
+    tlut är (adress, format) för CI4/CI8, tlut_cache delas mellan anrop.
+    Med en FileWriterPool som writer köas filerna i stället för att skrivas direkt.
+    """
+    fmt_norm = fmt.upper()
+    if fmt_norm == 'RGBA3':
+        fmt_norm = 'RGBA16'
+    total_bytes = texture_byte_size(fmt_norm, width, height)
 
     full_output_folder = os.path.join(output_folder, subfolder) if subfolder else output_folder
     clean_folder = os.path.join(output_folder, 'clean', subfolder)
-    os.makedirs(full_output_folder, exist_ok=True)
-    os.makedirs(clean_folder, exist_ok=True)
+    if writer is None:
+        os.makedirs(full_output_folder, exist_ok=True)
+        os.makedirs(clean_folder, exist_ok=True)
 
-    with open(filename, 'rb') as f:
-        f.seek(address)
-        data = f.read(total_bytes)
+    with matning.stage('read'):
+        data = read_range(filename, address, total_bytes)
+    matning.count('bytes_read', len(data))
 
     clean_file_path = os.path.join(clean_folder, f"{name}.bin")
-    with open(clean_file_path, 'wb') as clean_file:
-        clean_file.write(data)
-        print(f"Okonverterad data för '{name}' har sparats i '{clean_file_path}'")
+    if writer is not None:
+        writer.submit(clean_file_path, data)
+    else:
+        with matning.stage('write_bin'), open(clean_file_path, 'wb') as clean_file:
+            clean_file.write(data)
+            print(f"Okonverterad data för '{name}' har sparats i '{clean_file_path}'")
 
     try:
-        arr, mode = decode_to_png_array_and_mode(data, width, height, fmt_norm)
-        img = Image.fromarray(arr, mode)
-        img.save(os.path.join(full_output_folder, f"{name}.png"))
+        palette = None
+        if fmt_norm in ['CI4', 'CI8']:
+            if tlut is None:
+                raise ValueError(f"{fmt_norm} kräver en palett (Set Tlut)")
+            palette = load_tlut(filename, tlut[0], tlut_size(fmt_norm), tlut[1], tlut_cache)
+        with matning.stage('decode'):
+            arr, mode = decode_to_png_array_and_mode(data, width, height, fmt_norm, palette)
+            if compact:
+                arr, mode = compact_png_array_and_mode(arr, mode, fmt_norm)
+        matning.count('textures_decoded')
+        png_path = os.path.join(full_output_folder, f"{name}.png")
+        save_options = {} if compress_level is None else {'compress_level': compress_level}
+        if writer is not None:
+            # PNG-kodningen görs här, skrivningen i writer-trådarna
+            with matning.stage('png'):
+                buffer = io.BytesIO()
+                Image.fromarray(arr, mode).save(buffer, format='PNG', **save_options)
+            writer.submit(png_path, buffer.getvalue())
+            matning.count('png_bytes_written', buffer.tell())
+            print(f"Bilden '{name}.png' har köats för '{full_output_folder}'")
+            return
+
+        with matning.stage('png'):
+            img = Image.fromarray(arr, mode)
+            img.save(png_path, **save_options)
+        if matning.enabled():
+            matning.count('png_bytes_written', os.path.getsize(png_path))
         print(f"Bilden '{name}.png' har sparats i '{full_output_folder}'")
     except ValueError as e:
         print(f"Fel vid konvertering av '{name}': {e}")
 
-def parse_settings_and_extract(file_path, image_file, output_folder):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
+def parse_tlut_directive(parts):
+    """
+    'Set Tlut <adress> [RGBA16|IA16]' binder följande CI4/CI8-texturer
+    till paletten på adressen. Formatet är RGBA16 om inget anges.
+    """
+    tlut_fmt = parts[3].upper() if len(parts) > 3 else 'RGBA16'
+    return int(parts[2], 16), tlut_fmt
 
+def parse_settings_entries(file_path):
+    """
+    Läser en settings-fil och returnerar en lista med en dict per Exp-rad
+    (dir, format, width, height, address, name, tlut). Adressen är ett heltal
+    och tlut är (adress, format) från senaste 'Set Tlut', annars None.
+    """
+    entries = []
     width = height = None
     subfolder = ''
-    for line in lines:
-        if not line.strip() or line.strip().startswith('#'):
-            continue
-        parts = line.strip().split()
-        if parts[0] == 'Dir':
-            subfolder = parts[1]
-        elif parts[0] == 'Set' and parts[1] == 'TexS':
-            size = parts[2].split('x')
-            width, height = map(int, size)
-        elif parts[0] == 'Exp':
-            current_format = parts[1]
-            address = int(parts[2], 16)
-            name = parts[3]
-            extract_and_convert(image_file, output_folder, width, height, current_format, address, name, subfolder)
-
-def inject_image(filename, input_image_path, width, height, fmt, address):
+    tlut = None
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip() or line.strip().startswith('#'):
+                continue
+            parts = line.strip().split()
+            if parts[0] == 'Dir':
+                subfolder = parts[1]
+            elif parts[0] == 'Set' and parts[1] == 'TexS':
+                size = parts[2].split('x')
+                width, height = map(int, size)
+            elif parts[0] == 'Set' and parts[1] == 'Tlut':
+                tlut = parse_tlut_directive(parts)
+            elif parts[0] == 'Exp':
+                entries.append({
+                    'dir': subfolder,
+                    'format': parts[1],
+                    'width': width,
+                    'height': height,
+                    'address': int(parts[2], 16),
+                    'name': parts[3],
+                    'tlut': tlut
+                })
+    return entries
+
+@matning.profiled
+def parse_settings_and_extract(file_path, image_file, output_folder, compact=False, compress_level=None,
+                               writers=0):
+    """
+    writers > 0 skriver utdata via en FileWriterPool med så många trådar.
+    Returnerar skrivfelen från poolen som (sökväg, fel). Utan pool avbryter
+    ett skrivfel direkt.
+    """
+    tlut_cache = {}
+    with FileWriterPool(writers) if writers > 0 else contextlib.nullcontext() as writer:
+        for entry in parse_settings_entries(file_path):
+            extract_and_convert(image_file, output_folder, entry['width'], entry['height'], entry['format'],
+                                entry['address'], entry['name'], entry['dir'], compact, compress_level,
+                                entry['tlut'], tlut_cache, writer)
+    return writer.errors if writer is not None else []
+
+def inject_image(filename, input_image_path, width, height, fmt, address, tlut=None, tlut_cache=None):
     try:
         fmt_norm = fmt.upper()
         if fmt_norm == 'RGBA3':
             fmt_norm = 'RGBA16'
 
+        # CI-format kodas mot paletten som redan finns i ROM:en
+        palette = None
+        current = None
+        if fmt_norm in ['CI4', 'CI8']:
+            if tlut is None:
+                raise ValueError(f"{fmt_norm} kräver en palett (Set Tlut)")
+            palette = load_tlut(filename, tlut[0], tlut_size(fmt_norm), tlut[1], tlut_cache)
+            current = read_range(filename, address, texture_byte_size(fmt_norm, width, height))
+
         # Välj korrekt PIL-mode för inläsning före kodning
-        if fmt_norm in ['I4', 'I8']:
-            pil_mode = 'L'         # gråskala utan alfa
-        elif fmt_norm in ['IA4', 'IA8', 'IA16']:
-            pil_mode = 'LA'        # gråskala med alfa
-        elif fmt_norm in ['RGBA16', 'RGBA32']:
-            pil_mode = 'RGBA'      # färg med alfa
-        else:
-            raise ValueError(f"Okänt format: {fmt}")
+        pil_mode = injection_pil_mode(fmt_norm)
 
         print(f"Öppnar bild för injektering: {input_image_path}")
-        image = Image.open(input_image_path).convert(pil_mode).resize((width, height))
-        img_array = np.array(image)
-
-        encoded = encode_from_png_array(img_array, fmt_norm)
-
-        with open(filename, 'r+b') as f:
-            f.seek(address)
-            f.write(encoded)
-            print(f"Injicerat '{input_image_path}' till '{filename}' på adress {address:X}")
+        with matning.stage('png_read'):
+            image = Image.open(input_image_path).convert(pil_mode).resize((width, height))
+            img_array = np.array(image)
+
+        with matning.stage('encode'):
+            encoded = encode_from_png_array(img_array, fmt_norm, palette, current)
+        matning.count('textures_encoded')
+
+        with matning.stage('write'):
+            write_range(filename, address, bytes(encoded))
+        matning.count('bytes_written', len(encoded))
+        print(f"Injicerat '{input_image_path}' till '{filename}' på adress {address:X}")
     except Exception as e:
         print(f"Fel vid injektering av '{input_image_path}': {e}")
 
+@matning.profiled
 def parse_settings_and_inject(file_path, image_file, output_folder):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-
-    width = height = None
-    subfolder = ''
-    for line in lines:
-        if not line.strip() or line.strip().startswith('#'):
-            continue
-        parts = line.strip().split()
-        if parts[0] == 'Dir':
-            subfolder = parts[1]
-        elif parts[0] == 'Set' and parts[1] == 'TexS':
-            size = parts[2].split('x')
-            width, height = map(int, size)
-            print(f"Inställningar: {width}x{height}")
-        elif parts[0] == 'Exp':
-            current_format = parts[1]
-            address = int(parts[2], 16)
-            name = parts[3]
-            input_image_path = os.path.join(output_folder, subfolder, f"{name}.png")
-            print(f"Försöker injicera: {input_image_path} på adress {address:X}")
-            if os.path.exists(input_image_path):
-                inject_image(image_file, input_image_path, width, height, current_format, address)
-            else:
-                print(f"Filen '{input_image_path}' hittades inte.")
+    tlut_cache = {}
+    for entry in parse_settings_entries(file_path):
+        address = entry['address']
+        input_image_path = os.path.join(output_folder, entry['dir'], f"{entry['name']}.png")
+        print(f"Försöker injicera: {input_image_path} på adress {address:X}")
+        if os.path.exists(input_image_path):
+            inject_image(image_file, input_image_path, entry['width'], entry['height'], entry['format'], address,
+                         entry['tlut'], tlut_cache)
+        else:
+            print(f"Filen '{input_image_path}' hittades inte.")
 
 # ------------------------------------------------------------
 # GUI
@@ -476,7 +732,7 @@ class ImageExtractorApp:
     def __init__(self, master):
         self.master = master
         master.title('Bildextraherare')
-        master.geometry('360x300')
+        master.geometry('360x380')
 
         control_frame = tk.Frame(master)
         control_frame.pack(side=tk.LEFT, fill=tk.Y, padx=20)
@@ -492,7 +748,7 @@ class ImageExtractorApp:
         self.overwrite_check = tk.Checkbutton(control_frame, text="RW", variable=self.overwrite_var, command=self.update_start_button_state)
         self.overwrite_check.grid(row=0, column=2, sticky='w')
 
-        self.file_button = tk.Button(control_frame, text="Välj Z64-fil", command=self.load_image_file)
+        self.file_button = tk.Button(control_frame, text="Välj ROM-fil", command=self.load_image_file)
         self.file_button.grid(row=1, column=0, sticky='ew', pady=5)
         self.file_path_label = tk.Label(control_frame, text="")
         self.file_path_label.grid(row=1, column=1, columnspan=2, padx=10)
@@ -505,14 +761,31 @@ class ImageExtractorApp:
         self.start_button = tk.Button(control_frame, text="Starta konvertering", command=self.start_conversion)
         self.start_button.grid(row=3, column=0, sticky='ew', pady=5)
 
+        self.compact_var = tk.BooleanVar()
+        self.compact_check = tk.Checkbutton(control_frame, text="Kompakt PNG", variable=self.compact_var)
+        self.compact_check.grid(row=3, column=1, sticky='w', padx=10)
+        self.level_var = tk.StringVar(value='6')
+        self.level_spin = tk.Spinbox(control_frame, from_=0, to=9, width=3, textvariable=self.level_var)
+        self.level_spin.grid(row=3, column=2, sticky='w')
+
         self.inject_button = tk.Button(control_frame, text="Starta injektering", command=self.start_injection)
         self.inject_button.grid(row=4, column=0, sticky='ew', pady=5)
 
         self.run_button = tk.Button(control_frame, text="Starta Project64", command=self.start_project64)
         self.run_button.grid(row=5, column=0, sticky='ew', pady=5)
 
+        self.watch_button = tk.Button(control_frame, text="Starta bevakning", command=self.toggle_watch)
+        self.watch_button.grid(row=6, column=0, sticky='ew', pady=5)
+        self.watch_stop = None
+        self.reference_button = tk.Button(control_frame, text="Referens-ROM", command=self.choose_reference)
+        self.reference_button.grid(row=6, column=1, sticky='w', padx=10)
+        self.reference_path = None
+
+        self.verify_button = tk.Button(control_frame, text="Verifiera", command=self.start_verification)
+        self.verify_button.grid(row=7, column=0, sticky='ew', pady=5)
+
         self.status_label = tk.Label(control_frame, text="", wraplength=300)
-        self.status_label.grid(row=6, column=0, columnspan=3, pady=5)
+        self.status_label.grid(row=8, column=0, columnspan=3, pady=5)
 
     def populate_settings_menu(self):
         settings_files = [f for f in os.listdir('.') if f.endswith('.txt')]
@@ -521,11 +794,11 @@ class ImageExtractorApp:
             self.settings_var.set('PAL v1.0.txt')
 
     def load_image_file(self):
-        self.image_file_path = filedialog.askopenfilename(filetypes=[("Z64 files", "*.z64")])
+        self.image_file_path = filedialog.askopenfilename(filetypes=[("N64 ROM files", " ".join(f"*{ext}" for ext in ROM_EXTENSIONS))])
         if self.image_file_path:
             self.file_path_label.config(text=self.image_file_path)
-            self.status_label.config(text="Z64-fil vald.")
-            print(f"Z64-fil vald: {self.image_file_path}")
+            self.status_label.config(text="ROM-fil vald.")
+            print(f"ROM-fil vald: {self.image_file_path}")
 
     def choose_destination(self):
         self.output_folder = filedialog.askdirectory()
@@ -535,6 +808,14 @@ class ImageExtractorApp:
             print(f"Destination vald: {self.output_folder}")
             self.update_start_button_state()
 
+    def choose_reference(self):
+        """Oförändrad retail-ROM som bevakningens --skip "auto" läser skip-listan ur"""
+        path = filedialog.askopenfilename(filetypes=[("N64 ROM files", " ".join(f"*{ext}" for ext in ROM_EXTENSIONS))])
+        if path:
+            self.reference_path = path
+            self.status_label.config(text=f"Referens-ROM vald: {os.path.basename(path)}")
+            print(f"Referens-ROM vald: {path}")
+
     def update_start_button_state(self):
         if hasattr(self, 'output_folder'):
             if os.listdir(self.output_folder) and not self.overwrite_var.get():
@@ -542,16 +823,29 @@ class ImageExtractorApp:
             else:
                 self.start_button.config(state=tk.NORMAL)
 
+    def png_compress_level(self):
+        """Spinboxens nivå begränsad till 0-9, ogiltig text ger standardnivån 6"""
+        try:
+            level = min(9, max(0, int(self.level_var.get())))
+        except ValueError:
+            level = 6
+        self.level_var.set(str(level))
+        return level
+
     def start_conversion(self):
         if hasattr(self, 'image_file_path') and hasattr(self, 'output_folder'):
             settings_path = self.settings_var.get()
             print(f"Startar konvertering med inställningar från: {settings_path}")
-            parse_settings_and_extract(settings_path, self.image_file_path, self.output_folder)
-            self.status_label.config(text="Konvertering slutförd.")
+            errors = parse_settings_and_extract(settings_path, self.image_file_path, self.output_folder,
+                                                self.compact_var.get(), self.png_compress_level(), writers=4)
+            if errors:
+                self.status_label.config(text=f"Konvertering klar, men {len(errors)} fil(er) kunde inte skrivas.")
+            else:
+                self.status_label.config(text="Konvertering slutförd.")
             self.update_start_button_state()
         else:
-            self.status_label.config(text="Välj både en Z64-fil och en destination först.")
-            print("Välj både en Z64-fil och en destination först.")
+            self.status_label.config(text="Välj både en ROM-fil och en destination först.")
+            print("Välj både en ROM-fil och en destination först.")
 
     def start_injection(self):
         if hasattr(self, 'image_file_path') and hasattr(self, 'output_folder'):
@@ -560,8 +854,46 @@ class ImageExtractorApp:
             parse_settings_and_inject(settings_path, self.image_file_path, self.output_folder)
             self.status_label.config(text="Injektering slutförd.")
         else:
-            self.status_label.config(text="Välj både en Z64-fil och en destination först.")
-            print("Välj både en Z64-fil och en destination först.")
+            self.status_label.config(text="Välj både en ROM-fil och en destination först.")
+            print("Välj både en ROM-fil och en destination först.")
+
+    def toggle_watch(self):
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+            self.watch_stop = None
+            self.watch_button.config(text="Starta bevakning")
+            self.status_label.config(text="Bevakning stoppad.")
+            print("Bevakning stoppad.")
+            return
+
+        if hasattr(self, 'image_file_path') and hasattr(self, 'output_folder'):
+            from bevaka import start_watch_thread
+            settings_path = self.settings_var.get()
+            print(f"Startar bevakning av '{self.output_folder}' med inställningar från: {settings_path}")
+            references = [self.reference_path] if self.reference_path else None
+            self.watch_stop = start_watch_thread(settings_path, self.image_file_path, self.output_folder,
+                                                 references=references)
+            self.watch_button.config(text="Stoppa bevakning")
+            self.status_label.config(text="Bevakning pågår.")
+        else:
+            self.status_label.config(text="Välj både en ROM-fil och en destination först.")
+            print("Välj både en ROM-fil och en destination först.")
+
+    def start_verification(self):
+        if hasattr(self, 'image_file_path') and hasattr(self, 'output_folder'):
+            from verifiera import verify, print_report
+            settings_path = self.settings_var.get()
+            print(f"Startar verifiering med inställningar från: {settings_path}")
+            results = verify(settings_path, self.image_file_path, self.output_folder)
+            print_report(results)
+            mismatches = sum(1 for r in results if r['status'] in ['skiljer', 'fel'])
+            if mismatches:
+                self.status_label.config(text=f"Verifiering: {mismatches} textur(er) skiljer, se konsolen.")
+            else:
+                self.status_label.config(text="Verifiering: ROM:en stämmer med PNG-filerna.")
+        else:
+            self.status_label.config(text="Välj både en ROM-fil och en destination först.")
+            print("Välj både en ROM-fil och en destination först.")
 
     def start_project64(self):
         if hasattr(self, 'image_file_path'):
@@ -574,13 +906,24 @@ class ImageExtractorApp:
                 self.status_label.config(text=f"Fel vid start av Project64: {e}")
                 print(f"Fel vid start av Project64: {e}")
         else:
-            self.status_label.config(text="Välj en Z64-fil först.")
-            print("Välj en Z64-fil först.")
+            self.status_label.config(text="Välj en ROM-fil först.")
+            print("Välj en ROM-fil först.")
 
 # ------------------------------------------------------------
 # Programstart
 # ------------------------------------------------------------
 
-root = tk.Tk()
-app = ImageExtractorApp(root)
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    # tkinter laddas bara här, så att kodekerna och settings-parsern kan
+    # importeras av de andra verktygen på maskiner utan Tk
+    import tkinter as tk
+    from tkinter import filedialog
+    from tkinter import ttk
+
+    parser = argparse.ArgumentParser(description="Extraherar och injicerar N64-texturer")
+    matning.add_arguments(parser)
+    matning.enable_from_args(parser.parse_args())
+
+    root = tk.Tk()
+    app = ImageExtractorApp(root)
+    root.mainloop()
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 """
 ROM Compression Script
-Automatiskt komprimerar .z64 ROM-filer med rätt parametrar baserat på version
+Automatiskt komprimerar .z64/.v64/.n64 ROM-filer med rätt parametrar baserat på version
 Läser konfiguration från rom_config.txt
 """
 
+import argparse
+import json
+import shlex
 import subprocess
 import sys
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from romfil import ROM_EXTENSIONS, detect_file_byte_order, read_rom
+import skiplista
+
 
 def load_config(config_file='rom_config.txt'):
     """Läser konfigurationen från rom_config.txt"""
@@ -52,70 +61,207 @@ def detect_rom_version(filename, available_versions):
     return None
 
 
-def build_command(input_file, output_file, config_params):
-    """Bygger kommandosträngen för komprimering"""
-    cmd_str = (
-        f'z64compress-v1.0.2-win32.exe '
-        f'--in "{input_file}" '
-        f'--out "{output_file}" '
-        f'--mb 32 '
-        f'--codec yaz '
-        f'{config_params}'
-    )
-    
-    return cmd_str
+def find_reference(references, version):
+    """
+    Den referens-ROM vars filnamn innehåller versionen, annars None.
+    En ensam referens används oavsett namn, skiplista kontrollerar att
+    dess DMA-tabell stämmer med ROM:en.
+    """
+    if references and len(references) == 1:
+        return references[0]
+    for reference in references or []:
+        if detect_rom_version(reference, [version]):
+            return reference
+    return None
 
 
-def compress_rom(input_file, configs):
-    """Komprimerar en ROM-fil"""
+COMPRESSOR = 'z64compress-v1.0.2-win32.exe'
+
+
+def build_args(input_file, output_file, config_params, threads=None, cache_dir=None):
+    """Bygger z64compress-kommandot som argumentlista, utan skal"""
+    args = [COMPRESSOR, '--in', input_file, '--out', output_file, '--mb', '32', '--codec', 'yaz']
+    if threads:
+        args += ['--threads', str(threads)]
+    if cache_dir:
+        args += ['--cache', cache_dir]
+    return args + shlex.split(config_params)
+
+
+def print_event(label, kind, payload):
+    """Standardhantering av händelser från run_compressor"""
+    prefix = f"[{label}] " if label else ''
+    if kind == 'output':
+        print(f"{prefix}{payload}")
+    elif kind == 'timeout':
+        print(f"{prefix}❌ Avbruten efter {payload} s")
+
+
+def run_compressor(args, timeout=None, on_event=print_event, label=''):
+    """
+    Kör komprimeringsverktyget och skickar varje utdatarad som en
+    'output'-händelse medan det kör. Processen avbryts efter timeout
+    sekunder. Returnerar (returkod, avbruten_av_timeout).
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, bufsize=1, errors='replace')
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        for line in process.stdout:
+            on_event(label, 'output', line.rstrip())
+        process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        process.stdout.close()
+
+    if timed_out.is_set():
+        on_event(label, 'timeout', timeout)
+    return process.returncode, timed_out.is_set()
+
+
+def compress_job(input_file, configs, timeout=None, threads=None, output_dir=None, on_event=print_event,
+                 cache_dir=None, references=None, heuristic=False):
+    """
+    Komprimerar en ROM-fil och returnerar en rapport med version, status,
+    tid och storlekar. Utskrifter märks med versionen när flera jobb körs.
+    Med cache_dir återanvänder z64compress redan komprimerade filer (--cache).
+    references är retail-ROM:ar som --skip "auto" läser skip-listan ur.
+    heuristic tillåter zlib-prov när ingen komprimeringsinformation finns.
+    """
+    report = {'input': input_file, 'output': None, 'version': None, 'ok': False,
+              'seconds': 0.0, 'input_size': None, 'output_size': None, 'error': None}
+
+    def fail(message, detail=None):
+        print(f"❌ Fel: {message}")
+        if detail:
+            print(f"   {detail}")
+        report['error'] = message
+        return report
+
     # Kontrollera att filen finns
     if not os.path.exists(input_file):
-        print(f"❌ Fel: Filen '{input_file}' hittades inte!")
-        return False
+        return fail(f"Filen '{input_file}' hittades inte!")
+    report['input_size'] = os.path.getsize(input_file)
     
-    # Kontrollera filformat
-    if not input_file.lower().endswith('.z64'):
-        print(f"❌ Fel: Filen måste vara en .z64-fil!")
-        return False
+    # Kontrollera filformat och byteordning
+    if not input_file.lower().endswith(ROM_EXTENSIONS):
+        return fail(f"Filen måste vara en {', '.join(ROM_EXTENSIONS)}-fil!")
+    try:
+        byte_order = detect_file_byte_order(input_file)
+    except ValueError as e:
+        return fail(str(e))
     
     # Identifiera version
     version = detect_rom_version(input_file, configs.keys())
     if not version:
-        print(f"❌ Fel: Kunde inte identifiera ROM-version från filnamnet!")
-        print(f"   Filnamnet måste innehålla något av: {', '.join(configs.keys())}")
-        return False
+        return fail("Kunde inte identifiera ROM-version från filnamnet!",
+                    f"Filnamnet måste innehålla något av: {', '.join(configs.keys())}")
+    report['version'] = version
     
     print(f"✓ Identifierad version: {version.upper()}")
     
     # Skapa utdatafilnamn
     path = Path(input_file)
-    output_file = str(path.with_name(f"{path.stem}_recompressed{path.suffix}"))
+    output_folder = Path(output_dir) if output_dir else path.parent
+    output_file = str(output_folder / f"{path.stem}_recompressed.z64")
+    report['output'] = output_file
+
+    # z64compress läser bara big-endian, så .v64/.n64 normaliseras till en temporär .z64
+    compress_input = input_file
+    if byte_order != 'z64':
+        compress_input = str(path.with_name(f"{path.stem}_normalized.z64"))
+        with open(compress_input, 'wb') as f:
+            f.write(read_rom(input_file))
+        print(f"✓ Byteordning: {byte_order}, normaliserad till {compress_input}")
     
     print(f"✓ Input:  {input_file}")
     print(f"✓ Output: {output_file}")
     
+    # Härled --skip "auto" ur DMA-tabellen
+    try:
+        config_params = skiplista.expand_auto_skip(compress_input, configs[version],
+                                                   reference=find_reference(references, version),
+                                                   heuristic=heuristic)
+    except (ValueError, OSError) as e:
+        if compress_input != input_file:
+            os.remove(compress_input)
+        return fail(f"Kunde inte härleda skip-listan: {e}")
+    if config_params != configs[version]:
+        print(f"✓ Skip-lista härledd ur DMA-tabellen ({config_params.count('--skip')} filer)")
+    
     # Bygg kommando
-    cmd_str = build_command(input_file, output_file, configs[version])
+    args = build_args(compress_input, output_file, config_params, threads, cache_dir)
     
     # Visa kommandot
     print(f"\n📋 Kör kommando:")
-    print(cmd_str)
+    print(subprocess.list2cmdline(args))
     print()
     
     # Kör komprimering
+    start = time.perf_counter()
     try:
-        result = subprocess.run(cmd_str, shell=True, check=True, capture_output=True, text=True)
-        print(result.stdout)
-        print(f"\n✅ Komprimering klar! Utdatafil: {output_file}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Fel vid komprimering:")
-        print(e.stderr)
-        return False
+        returncode, timed_out = run_compressor(args, timeout, on_event, version)
     except FileNotFoundError:
-        print(f"❌ Fel: z64compress-v1.0.2-win32.exe hittades inte!")
-        print(f"   Se till att programmet finns i samma mapp eller i PATH.")
-        return False
+        return fail(f"{COMPRESSOR} hittades inte!", "Se till att programmet finns i samma mapp eller i PATH.")
+    finally:
+        report['seconds'] = time.perf_counter() - start
+        if compress_input != input_file and os.path.exists(compress_input):
+            os.remove(compress_input)
+
+    if timed_out:
+        return fail(f"Komprimeringen av {version.upper()} avbröts efter {timeout} s")
+    if returncode != 0:
+        return fail(f"Komprimeringen av {version.upper()} misslyckades (kod {returncode})")
+    if not os.path.exists(output_file):
+        return fail(f"{COMPRESSOR} avslutades utan att skapa {output_file}")
+    report['ok'] = True
+    report['output_size'] = os.path.getsize(output_file)
+    print(f"\n✅ Komprimering klar! Utdatafil: {output_file}")
+    return report
+
+
+def compress_rom(input_file, configs, timeout=None, cache_dir=None, references=None):
+    """Komprimerar en ROM-fil"""
+    return compress_job(input_file, configs, timeout, cache_dir=cache_dir, references=references)['ok']
+
+
+def compress_many(input_files, configs, jobs=None, cpu_budget=None, timeout=None, output_dir=None,
+                  references=None, heuristic=False):
+    """
+    Komprimerar flera ROM-filer samtidigt. cpu_budget (standard: antal
+    kärnor) delas mellan jobben via z64compress --threads.
+    """
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    jobs = max(1, min(jobs or cpu_budget, len(input_files), cpu_budget))
+    threads = max(1, cpu_budget // jobs)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(compress_job, input_file, configs, timeout, threads, output_dir,
+                                   references=references, heuristic=heuristic)
+                   for input_file in input_files]
+        return [future.result() for future in futures]
+
+
+def print_summary(reports):
+    """Skriver tid och storlek per jobb"""
+    mb = 1024 * 1024
+    print("\n" + "=" * 50)
+    print(f"{'Version':<10}{'Status':<8}{'Tid (s)':>9}{'In (MB)':>10}{'Ut (MB)':>10}")
+    for report in reports:
+        version = (report['version'] or os.path.basename(report['input'])).upper()
+        status = 'OK' if report['ok'] else 'FEL'
+        in_mb = f"{report['input_size'] / mb:.2f}" if report['input_size'] else '-'
+        out_mb = f"{report['output_size'] / mb:.2f}" if report['output_size'] else '-'
+        print(f"{version:<10}{status:<8}{report['seconds']:>9.2f}{in_mb:>10}{out_mb:>10}")
 
 
 def main():
@@ -128,21 +274,48 @@ def main():
         print("ROM Compression Script")
         print("=" * 50)
         print("\nAnvändning:")
-        print(f"  python {sys.argv[0]} <rom-fil.z64>")
+        print(f"  python {sys.argv[0]} <rom-fil.z64|.v64|.n64> [fler ROM-filer ...]")
+        print("      [--jobb N] [--cpu N] [--timeout SEK] [--ut MAPP] [--json FIL] [--referens ROM ...] [--heuristik]")
         print("\nStödda versioner (från rom_config.txt):")
         for version in configs.keys():
             print(f"  - {version.upper()}")
         print("\nExempel:")
         print(f"  python {sys.argv[0]} zelda_pal10.z64")
         print(f"  python {sys.argv[0]} game_ntsc12.z64")
+        print(f"  python {sys.argv[0]} zelda_pal10.z64 zelda_ntsc10.z64 zelda_ntscmq.z64 --jobb 3")
         print("\nOm du vill ändra komprimeringsparametrar,")
         print("redigera rom_config.txt och klistra in från z64compress output.")
+        print('Med --skip "auto" härleds skip-listan ur ROM:ens DMA-tabell (se skiplista.py).')
+        print('Det kräver oförändrade retail-ROM:ar via --referens, eller --heuristik för en')
+        print('uppskattning med zlib-prov som kan ge en ospelbar ROM.')
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    success = compress_rom(input_file, configs)
+    parser = argparse.ArgumentParser(description="Komprimerar en eller flera ROM-filer")
+    parser.add_argument('roms', nargs='+', help="ROM-filer att komprimera")
+    parser.add_argument('--jobb', type=int, help="antal samtidiga jobb (standard: inom CPU-budgeten)")
+    parser.add_argument('--cpu', type=int, help="totalt antal kärnor att använda (standard: alla)")
+    parser.add_argument('--timeout', type=float, help="avbryt ett jobb efter så många sekunder")
+    parser.add_argument('--ut', help="mapp för komprimerade filer (standard: bredvid indata)")
+    parser.add_argument('--json', help="spara rapporten per jobb som JSON")
+    parser.add_argument('--referens', nargs='+', help="retail-ROM:ar för --skip \"auto\" (version ur filnamnet)")
+    parser.add_argument('--heuristik', action='store_true',
+                        help="tillåt zlib-prov för --skip \"auto\" utan referens (listan kan bli för kort)")
+    args = parser.parse_args()
+
+    if len(args.roms) == 1 and not args.cpu:
+        reports = [compress_job(args.roms[0], configs, args.timeout, output_dir=args.ut, references=args.referens,
+                                heuristic=args.heuristik)]
+    else:
+        reports = compress_many(args.roms, configs, args.jobb, args.cpu, args.timeout, args.ut, args.referens,
+                                args.heuristik)
+    print_summary(reports)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Rapport sparad: {args.json}")
     
-    sys.exit(0 if success else 1)
+    sys.exit(0 if all(report['ok'] for report in reports) else 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+"""
+Mätning av tid och räknare per steg
+Avstängt som standard. Slås på med miljövariabler eller enable():
+  BITEXTRACT_METRICS=<fil.json>   skriv en JSON-sammanfattning efter körningen
+  BITEXTRACT_METRICS=1            skriv sammanfattningen till stdout
+  BITEXTRACT_PROFILE=<mapp>       spara cProfile-dumpar för @profiled-funktioner
+Kommandoradsverktygen har motsvarande flaggor via add_arguments().
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_config = {
+    'metrics': os.environ.get('BITEXTRACT_METRICS') or None,
+    'profile': os.environ.get('BITEXTRACT_PROFILE') or None,
+}
+# Djup av @profiled-anrop per tråd, så att bara det yttersta nollställer och skriver
+_local = threading.local()
+
+
+def enable(metrics='1', profile_dir=None):
+    """Slår på mätning från kod, t.ex. via en kommandoradsflagga"""
+    _config['metrics'] = metrics
+    _config['profile'] = profile_dir
+
+
+def add_arguments(parser):
+    """Lägger till --matning och --profil i en argparse-parser"""
+    parser.add_argument('--matning', nargs='?', const='1', metavar='FIL',
+                        help="skriv tider och räknare som JSON till FIL (utan FIL: stdout)")
+    parser.add_argument('--profil', metavar='MAPP', help="spara cProfile-dumpar i MAPP")
+
+
+def enable_from_args(args):
+    """Slår på mätning om --matning eller --profil angavs"""
+    if args.matning or args.profil:
+        enable(args.matning, args.profil)
+
+
+def enabled():
+    return _config['metrics'] is not None or _config['profile'] is not None
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Mäter tiden för ett steg, t.ex. 'read', 'decode' eller 'png'"""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry = _stages.setdefault(name, {'calls': 0, 'total_s': 0.0, 'max_s': 0.0})
+            entry['calls'] += 1
+            entry['total_s'] += elapsed
+            entry['max_s'] = max(entry['max_s'], elapsed)
+
+
+def count(name, amount=1):
+    """Ökar en räknare, t.ex. 'bytes_read' eller 'textures_decoded'"""
+    if not enabled():
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def summary():
+    with _lock:
+        return {
+            'stages': {name: dict(entry) for name, entry in _stages.items()},
+            'counters': dict(_counters),
+        }
+
+
+def write_summary(path=None):
+    """Skriver sammanfattningen som JSON till fil, eller stdout om path är '1'"""
+    path = path or _config['metrics']
+    if not path:
+        return
+    text = json.dumps(summary(), indent=2)
+    if path == '1':
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Mätdata sparad: {path}")
+
+
+def profiled(func):
+    """
+    Mäter hela anropet som ett steg med funktionens namn. Det yttersta
+    anropet nollställer mätdatan, så att sammanfattningen bara gäller
+    den här körningen. Med en profileringsmapp körs det under cProfile och
+    dumpas till <mapp>/<funktion>.prof. Sammanfattningen skrivs när det är klart.
+    Inre @profiled-anrop mäts bara som steg.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled():
+            return func(*args, **kwargs)
+        if getattr(_local, 'depth', 0):
+            with stage(func.__name__):
+                return func(*args, **kwargs)
+
+        reset()
+        _local.depth = 1
+        profiler = None
+        if _config['profile']:
+            os.makedirs(_config['profile'], exist_ok=True)
+            profiler = cProfile.Profile()
+        try:
+            with stage(func.__name__):
+                if profiler is None:
+                    return func(*args, **kwargs)
+                return profiler.runcall(func, *args, **kwargs)
+        finally:
+            _local.depth = 0
+            if profiler is not None:
+                profile_path = os.path.join(_config['profile'], f"{func.__name__}.prof")
+                profiler.dump_stats(profile_path)
+                print(f"Profil sparad: {profile_path}")
+            write_summary()
+    return wrapper
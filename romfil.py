@@ -0,0 +1,125 @@
+"""
+Hjälpfunktioner för ROM-filer i olika byteordning
+.z64 är big-endian (native), .v64 är byteswappad per 16 bitar och
+.n64 är little-endian per 32 bitar. Byteordningen avgörs av huvudets magic.
+"""
+
+import mmap
+
+import numpy as np
+
+ROM_EXTENSIONS = ('.z64', '.v64', '.n64')
+
+MAGIC = {
+    b'\x80\x37\x12\x40': 'z64',
+    b'\x37\x80\x40\x12': 'v64',
+    b'\x40\x12\x37\x80': 'n64',
+}
+
+# Ordlängd att byteswappa per byteordning
+WORD_SIZE = {'z64': 1, 'v64': 2, 'n64': 4}
+
+
+def detect_byte_order(header: bytes) -> str:
+    """Returnerar 'z64', 'v64' eller 'n64' utifrån de fyra första byten"""
+    order = MAGIC.get(bytes(header[:4]))
+    if order is None:
+        raise ValueError(f"Okänd ROM-header: {bytes(header[:4]).hex()}")
+    return order
+
+
+def detect_file_byte_order(filename) -> str:
+    with open(filename, 'rb') as f:
+        return detect_byte_order(f.read(4))
+
+
+def swap(data: bytes, order: str) -> bytes:
+    """
+    Växlar mellan z64-ordning och den angivna ordningen. Operationen är
+    sin egen invers, så samma funktion används åt båda hållen.
+    Längden måste vara en multipel av ordlängden.
+    """
+    if order == 'z64':
+        return bytes(data)
+    dtype = np.uint16 if WORD_SIZE[order] == 2 else np.uint32
+    return np.frombuffer(data, dtype=dtype).byteswap().tobytes()
+
+
+def _aligned_window(address, length):
+    start = address & ~3
+    end = (address + length + 3) & ~3
+    return start, end
+
+
+def read_rom(filename) -> bytes:
+    """Läser hela ROM:en och returnerar den i z64-ordning"""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    return swap(data, detect_byte_order(data))
+
+
+def read_range(filename, address, length, order=None) -> bytes:
+    """Läser 'length' byte från en z64-adress, oavsett filens byteordning"""
+    with open(filename, 'rb') as f:
+        if order is None:
+            order = detect_byte_order(f.read(4))
+        if order == 'z64':
+            f.seek(address)
+            return f.read(length)
+        start, end = _aligned_window(address, length)
+        f.seek(start)
+        window = swap(f.read(end - start), order)
+    return window[address - start:address - start + length]
+
+
+def write_range(filename, address, data, order=None):
+    """Skriver data på en z64-adress och behåller filens byteordning"""
+    with open(filename, 'r+b') as f:
+        if order is None:
+            order = detect_byte_order(f.read(4))
+        if order == 'z64':
+            f.seek(address)
+            f.write(data)
+            return
+        start, end = _aligned_window(address, len(data))
+        f.seek(start)
+        window = bytearray(swap(f.read(end - start), order))
+        window[address - start:address - start + len(data)] = data
+        f.seek(start)
+        f.write(swap(bytes(window), order))
+
+
+class RomView:
+    """
+    Minnesmappad ROM som läses i z64-ordning. Bara de fönster som läses
+    byteswappas, så .v64/.n64 kräver ingen konvertering av hela filen.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.order = detect_byte_order(self._map[:4])
+        except ValueError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._map)
+
+    def read(self, address, length) -> bytes:
+        if self.order == 'z64':
+            return self._map[address:address + length]
+        start, end = _aligned_window(address, length)
+        window = swap(self._map[start:end], self.order)
+        return window[address - start:address - start + length]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
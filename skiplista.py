@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Skip-lista från DMA-tabellen
+Läser DMA-tabellen på adressen från --dma och avgör vilka filer som ska
+lämnas okomprimerade, i stället för handklistrade --skip-rader.
+Verktygets indata är en dekomprimerad ROM där komprimeringsinformationen
+är borta, så listan tas från en oförändrad retail-ROM (--referens).
+Utan komprimeringsinformation vägrar "auto" att gissa, om inte zlib-proven
+slås på uttryckligen med --heuristik.
+Resultatet cachas per DMA-tabell eller referens-ROM i skiplista_cache.json.
+
+I rom_config.txt ersätts --skip "auto" med den härledda listan. Övriga
+--skip-flaggor på raden behålls som fasta tillägg.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+from romfil import RomView
+
+CACHE_FILE = 'skiplista_cache.json'
+AUTO = 'auto'
+
+# makerom, boot och dmadata läses alltid okomprimerade
+STRUCTURAL_ENTRIES = 3
+# Filer som spelet DMA:ar okomprimerade i alla versioner, fast de går att komprimera
+RAW_ENTRIES = {
+    3: 'Audiobank',
+    4: 'Audioseq',
+    5: 'Audiotable',
+    6: 'link_animetion',
+    7: 'icon_item_static',
+    8: 'icon_item_24_static',
+}
+# Filer som zlib inte får ner under denna andel räknas som okomprimerbara
+DEFAULT_THRESHOLD = 0.95
+SAMPLE_SIZE = 0x1000
+SAMPLES_PER_FILE = 3
+
+_cache_lock = threading.Lock()
+
+
+def parse_dma_argument(config_params):
+    """Plockar (adress, antal poster) ur --dma "0x7950,1527" i en konfigurationsrad"""
+    args = shlex.split(config_params)
+    for flag, value in zip(args, args[1:]):
+        if flag == '--dma':
+            address, count = value.split(',')
+            return int(address, 0), int(count)
+    raise ValueError("Konfigurationsraden saknar --dma")
+
+
+def parse_skip_arguments(config_params):
+    """Returnerar (fasta skip-index, om 'auto' finns med)"""
+    args = shlex.split(config_params)
+    pinned = set()
+    auto = False
+    for flag, value in zip(args, args[1:]):
+        if flag == '--skip':
+            if value.lower() == AUTO:
+                auto = True
+            else:
+                pinned.add(int(value))
+    return pinned, auto
+
+
+def read_dma_table(rom, address, count):
+    """DMA-tabellen som (count, 4) array: vrom_start, vrom_end, rom_start, rom_end"""
+    return np.frombuffer(rom.read(address, count * 16), dtype='>u4').reshape(count, 4).astype(np.int64)
+
+
+def compression_ratio(rom, start, end):
+    """Uppskattar komprimerbarheten med zlib på några prov ur filen"""
+    size = end - start
+    if size <= SAMPLE_SIZE * SAMPLES_PER_FILE:
+        offsets = [start]
+        length = size
+    else:
+        step = (size - SAMPLE_SIZE) // (SAMPLES_PER_FILE - 1)
+        offsets = [start + i * step for i in range(SAMPLES_PER_FILE)]
+        length = SAMPLE_SIZE
+    raw = b''.join(rom.read(offset, length) for offset in offsets)
+    return len(zlib.compress(raw, 1)) / len(raw)
+
+
+def has_retail_info(table):
+    """Om någon post har rom_end != 0, dvs. Nintendos komprimeringsinformation finns kvar"""
+    rom_start, rom_end = table[:, 2], table[:, 3]
+    return bool(np.any((rom_end != 0) & (rom_start != 0xFFFFFFFF)))
+
+
+def classify_entries(rom, address, count, threshold=DEFAULT_THRESHOLD, heuristic=False):
+    """
+    Returnerar en dict index -> orsak för filer som ska hoppas över.
+    Har ROM:en kvar Nintendos komprimeringsinformation används den:
+    poster med rom_end == 0 låg okomprimerade. Annars krävs heuristic,
+    och struktur, RAW_ENTRIES, tomma poster och komprimerbarhetsprov avgör.
+    Komprimerbarheten säger inte vilka filer spelet läser okomprimerade,
+    så den listan blir för kort för en spelbar ROM och är bara en uppskattning.
+    """
+    table = read_dma_table(rom, address, count)
+    vrom_start, vrom_end, rom_start, rom_end = table.T
+    retail = has_retail_info(table)
+    if not retail and not heuristic:
+        raise ValueError("ROM:en saknar komprimeringsinformation (dekomprimerad?). "
+                         "Ange en oförändrad retail-ROM med --referens, eller --heuristik för en uppskattning")
+
+    skips = {}
+    for index in range(count):
+        if index < STRUCTURAL_ENTRIES:
+            skips[index] = 'struktur'
+        elif index in RAW_ENTRIES:
+            skips[index] = f"okomprimerad fil ({RAW_ENTRIES[index]})"
+        elif rom_start[index] == 0xFFFFFFFF or vrom_end[index] <= vrom_start[index]:
+            skips[index] = 'tom'
+        elif retail:
+            if rom_end[index] == 0:
+                skips[index] = 'okomprimerad i original'
+        elif vrom_end[index] > len(rom):
+            skips[index] = 'utanför ROM'
+        elif compression_ratio(rom, vrom_start[index], vrom_end[index]) >= threshold:
+            skips[index] = 'okomprimerbar'
+    return skips
+
+
+def rom_hash(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def load_cache(cache_file=CACHE_FILE):
+    if not os.path.exists(cache_file):
+        return {}
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cache(cache, cache_file=CACHE_FILE):
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+
+
+def check_reference(rom, reference, address, count):
+    """Referens-ROM:en måste ha samma fillayout (vrom-adresser) som ROM:en"""
+    if not np.array_equal(read_dma_table(rom, address, count)[:, :2],
+                          read_dma_table(reference, address, count)[:, :2]):
+        raise ValueError("Referens-ROM:ens DMA-tabell stämmer inte med ROM:ens, fel version?")
+
+
+def derive_skip_list(rom_file, address, count, threshold=DEFAULT_THRESHOLD, cache_file=CACHE_FILE,
+                     reference=None, heuristic=False):
+    """
+    Sorterad skip-lista för ROM:en. Med en referens-ROM (oförändrad retail)
+    används dess komprimeringsinformation och cachen nycklas på dess hash.
+    Annars nycklas cachen på DMA-tabellens bytes, som injektering av
+    texturer inte ändrar, så en nyinjicerad ROM träffar cachen.
+    Utan komprimeringsinformation krävs heuristic, se classify_entries.
+    """
+    with RomView(rom_file) as rom, RomView(reference or rom_file) as source:
+        if reference:
+            check_reference(rom, source, address, count)
+            key = f"referens:{rom_hash(reference)}:{address:X}:{count}"
+        else:
+            table = hashlib.sha1(rom.read(address, count * 16)).hexdigest()
+            key = f"dma:{table}:{address:X}:{count}:{threshold}:{'heuristik' if heuristic else 'retail'}"
+        with _cache_lock:
+            cached = load_cache(cache_file).get(key)
+        if cached is not None:
+            return cached
+        skips = sorted(classify_entries(source, address, count, threshold, heuristic))
+
+    # Parallella kompress-jobb kan skriva cachen samtidigt
+    with _cache_lock:
+        cache = load_cache(cache_file)
+        cache[key] = skips
+        save_cache(cache, cache_file)
+    return skips
+
+
+def expand_auto_skip(rom_file, config_params, threshold=DEFAULT_THRESHOLD, cache_file=CACHE_FILE,
+                     reference=None, heuristic=False):
+    """
+    Ersätter --skip "auto" i en konfigurationsrad med den härledda listan
+    plus de fasta --skip-indexen. Rader utan auto returneras oförändrade.
+    Ger ValueError om listan inte kan härledas säkert, se classify_entries.
+    """
+    pinned, auto = parse_skip_arguments(config_params)
+    if not auto:
+        return config_params
+
+    address, count = parse_dma_argument(config_params)
+    skips = derive_skip_list(rom_file, address, count, threshold, cache_file, reference, heuristic)
+    skips = sorted(set(skips) | pinned)
+
+    args = shlex.split(config_params)
+    kept = []
+    i = 0
+    while i < len(args):
+        if args[i] == '--skip' and i + 1 < len(args):
+            i += 2
+            continue
+        kept.append(args[i])
+        i += 1
+    for index in skips:
+        kept += ['--skip', str(index)]
+    return shlex.join(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Härleder z64compress --skip-listan ur ROM:ens DMA-tabell")
+    parser.add_argument('rom', help="ROM-fil (.z64/.v64/.n64)")
+    parser.add_argument('--dma', help="adress och antal poster, t.ex. 0x7950,1527")
+    parser.add_argument('--version', help="läs --dma från denna sektion i rom_config.txt")
+    parser.add_argument('--referens', help="oförändrad retail-ROM av samma version att läsa skip-listan ur")
+    parser.add_argument('--heuristik', action='store_true',
+                        help="tillåt zlib-prov när ROM:en saknar komprimeringsinformation (listan kan bli för kort)")
+    parser.add_argument('--troskel', type=float, default=DEFAULT_THRESHOLD,
+                        help="zlib-andel över vilken en fil räknas som okomprimerbar")
+    parser.add_argument('--visa', action='store_true', help="visa orsak per fil i stället för flaggor")
+    parser.add_argument('--jamfor', action='store_true', help="jämför mot handlistan i rom_config.txt")
+    args = parser.parse_args()
+
+    config_params = None
+    if args.version:
+        # kompress importerar den här modulen, så importen görs först här
+        import kompress
+        configs = kompress.load_config()
+        if not configs or args.version.lower() not in configs:
+            print(f"❌ Fel: Sektionen '{args.version}' finns inte i rom_config.txt!")
+            sys.exit(1)
+        config_params = configs[args.version.lower()]
+
+    if args.dma:
+        address, count = (int(part, 0) for part in args.dma.split(','))
+    elif config_params:
+        address, count = parse_dma_argument(config_params)
+    else:
+        print("❌ Fel: Ange --dma eller --version!")
+        sys.exit(1)
+
+    try:
+        if args.visa:
+            with RomView(args.referens or args.rom) as rom:
+                skips = classify_entries(rom, address, count, args.troskel, args.heuristik)
+            for index, reason in sorted(skips.items()):
+                print(f"{index:5}  {reason}")
+            return
+        skips = derive_skip_list(args.rom, address, count, args.troskel, reference=args.referens,
+                                 heuristic=args.heuristik)
+    except ValueError as e:
+        print(f"❌ Fel: {e}")
+        sys.exit(1)
+    print(' '.join(f'--skip "{index}"' for index in skips))
+
+    if args.jamfor:
+        if not config_params:
+            print("❌ Fel: --jamfor kräver --version!")
+            sys.exit(1)
+        hand, _ = parse_skip_arguments(config_params)
+        print(f"\nEndast härledda: {sorted(set(skips) - hand)}")
+        print(f"Endast i rom_config.txt: {sorted(hand - set(skips))}")
+
+
+if __name__ == "__main__":
+    main()
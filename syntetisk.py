@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Syntetiska testdata
+Skapar en deterministisk låtsas-ROM där slumpade texturer ligger på
+adresserna från en settings-fil, plus planterade dubbletter och flyttade
+texturer. Används för prestandatester utan upphovsrättsskyddad ROM.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from extrgui import parse_settings_entries, texture_byte_size
+from romfil import MAGIC
+
+Z64_MAGIC = next(magic for magic, order in MAGIC.items() if order == 'z64')
+ALIGNMENT = 0x10
+MB = 1024 * 1024
+
+
+def align(value, alignment=ALIGNMENT):
+    return (value + alignment - 1) & ~(alignment - 1)
+
+
+def scaled_entries(entries, scale):
+    """
+    Upprepar manifestet 'scale' gånger. Kopia 0 behåller originalen,
+    kopia k hamnar i Dir '<dir>_x<k>' och får adress senare vid layout.
+    """
+    result = []
+    for k in range(scale):
+        for entry in entries:
+            entry = dict(entry)
+            if k:
+                entry['dir'] = f"{entry['dir']}_x{k}"
+                entry['address'] = None
+            result.append(entry)
+    return result
+
+
+def write_settings(entries, path):
+    """Skriver poster i samma format som settings-filerna (Dir, Set TexS, Set Tlut, Exp)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        current_dir = None
+        current_size = None
+        current_tlut = None
+        for entry in entries:
+            if entry['dir'] != current_dir:
+                current_dir = entry['dir']
+                current_size = None
+                f.write(f"Dir {current_dir}\n")
+            size = f"{entry['width']}x{entry['height']}"
+            if size != current_size:
+                current_size = size
+                f.write(f"Set TexS {size}\n")
+            if entry.get('tlut') and entry['tlut'] != current_tlut:
+                current_tlut = entry['tlut']
+                f.write(f"Set Tlut {current_tlut[0]:X} {current_tlut[1]}\n")
+            f.write(f"Exp {entry['format']} {entry['address']:X} {entry['name']}\n")
+
+
+def generate_fixture(settings_path, output_folder, scale=1, size_mb=None, seed=0,
+                     duplicates=8, relocations=8):
+    """
+    Skapar i output_folder:
+      synthetic.z64   ROM:en
+      synthetic.txt   settings med adresserna före flytt (som en PAL-fil mot NTSC)
+      clean/          de korrekta rådata per textur, som analysera.py söker efter
+      manifest.json   facit för dubbletter och flyttade texturer
+    Returnerar manifestet som dict.
+    """
+    rng = np.random.default_rng(seed)
+    entries = scaled_entries(parse_settings_entries(settings_path), scale)
+    for entry in entries:
+        entry['size'] = texture_byte_size(entry['format'], entry['width'], entry['height'])
+
+    # Nya adresser läggs efter sista texturen i originalfilen
+    next_free = align(max(e['address'] + e['size'] for e in entries if e['address'] is not None))
+
+    def allocate(size):
+        nonlocal next_free
+        address = next_free
+        next_free = align(next_free + size)
+        return address
+
+    for entry in entries:
+        if entry['address'] is None:
+            entry['address'] = allocate(entry['size'])
+
+    # Välj texturer att flytta och duplicera bland dem med unik adress
+    address_counts = {}
+    for entry in entries:
+        address_counts[entry['address']] = address_counts.get(entry['address'], 0) + 1
+    candidates = [i for i, e in enumerate(entries) if address_counts[e['address']] == 1]
+    picked = rng.choice(len(candidates), size=min(len(candidates), duplicates + relocations), replace=False)
+    relocated = {candidates[i]: allocate(entries[candidates[i]]['size']) for i in picked[:relocations]}
+    duplicated = {candidates[i]: allocate(entries[candidates[i]]['size']) for i in picked[relocations:]}
+
+    rom_size = align(next_free, MB)
+    if size_mb is not None:
+        if size_mb * MB < rom_size:
+            raise ValueError(f"ROM-storleken {size_mb} MB räcker inte, minst {rom_size // MB} MB behövs")
+        rom_size = size_mb * MB
+
+    rom = bytearray(rng.bytes(rom_size))
+    rom[:len(Z64_MAGIC)] = Z64_MAGIC
+
+    clean_folder = os.path.join(output_folder, 'clean')
+    shared = {}
+    for i, entry in enumerate(entries):
+        # Poster som delar adress delar också data
+        data = shared.get((entry['address'], entry['size']))
+        if data is None:
+            data = shared[(entry['address'], entry['size'])] = rng.bytes(entry['size'])
+        address = relocated.get(i, entry['address'])
+        rom[address:address + entry['size']] = data
+        if i in duplicated:
+            rom[duplicated[i]:duplicated[i] + entry['size']] = data
+
+        entry_folder = os.path.join(clean_folder, entry['dir'])
+        os.makedirs(entry_folder, exist_ok=True)
+        with open(os.path.join(entry_folder, f"{entry['name']}.bin"), 'wb') as f:
+            f.write(data)
+
+    os.makedirs(output_folder, exist_ok=True)
+    rom_path = os.path.join(output_folder, 'synthetic.z64')
+    with open(rom_path, 'wb') as f:
+        f.write(rom)
+
+    settings_out = os.path.join(output_folder, 'synthetic.txt')
+    write_settings(entries, settings_out)
+
+    manifest = {
+        'source_settings': os.path.basename(settings_path),
+        'seed': seed,
+        'scale': scale,
+        'rom': rom_path,
+        'settings': settings_out,
+        'clean': clean_folder,
+        'rom_size': rom_size,
+        'textures': len(entries),
+        'texture_bytes': sum(e['size'] for e in entries),
+        'duplicates': [
+            {'dir': entries[i]['dir'], 'name': entries[i]['name'],
+             'address': entries[i]['address'], 'copy': address}
+            for i, address in duplicated.items()
+        ],
+        'relocations': [
+            {'dir': entries[i]['dir'], 'name': entries[i]['name'],
+             'from': entries[i]['address'], 'to': address}
+            for i, address in relocated.items()
+        ],
+    }
+    with open(os.path.join(output_folder, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skapar en syntetisk ROM med texturer enligt en settings-fil")
+    parser.add_argument('settings', help="settings-fil, t.ex. 'PAL v1.0.txt'")
+    parser.add_argument('mapp', help="mapp där ROM, settings och facit sparas")
+    parser.add_argument('--skala', type=int, default=1, help="antal kopior av varje textur (1, 10, 100 ...)")
+    parser.add_argument('--storlek-mb', type=int, help="ROM-storlek i MB (standard: minsta som räcker)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dubbletter', type=int, default=8, help="antal texturer som får en extra kopia")
+    parser.add_argument('--flyttade', type=int, default=8, help="antal texturer som flyttas från sin adress")
+    args = parser.parse_args()
+
+    manifest = generate_fixture(args.settings, args.mapp, args.skala, args.storlek_mb, args.seed,
+                                args.dubbletter, args.flyttade)
+    print(f"✓ ROM:      {manifest['rom']} ({manifest['rom_size'] // MB} MB)")
+    print(f"✓ Settings: {manifest['settings']}")
+    print(f"✓ Texturer: {manifest['textures']}, dubbletter: {len(manifest['duplicates'])}, "
+          f"flyttade: {len(manifest['relocations'])}")
+
+
+if __name__ == "__main__":
+    main()
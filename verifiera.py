@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Verifiering
+Kodar varje PNG i utdatamappen och jämför mot motsvarande bytes i ROM:en.
+Rapporterar texturer som skiljer sig med antal avvikande pixlar.
+Avslutar med kod 1 om något skiljer, så att den kan användas i byggen.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+import matning
+from extrgui import (
+    decode_to_png_array_and_mode,
+    encode_from_png_array,
+    injection_pil_mode,
+    load_tlut,
+    parse_settings_entries,
+    texture_byte_size,
+    tlut_size,
+)
+from romfil import RomView
+
+
+def pixel_diff_count(rom_bytes, encoded, width, height, fmt, palette=None):
+    """Antal pixlar som skiljer när båda versionerna avkodas"""
+    rom_pixels, _ = decode_to_png_array_and_mode(rom_bytes, width, height, fmt, palette)
+    png_pixels, _ = decode_to_png_array_and_mode(encoded, width, height, fmt, palette)
+    return int(np.any(rom_pixels != png_pixels, axis=-1).sum())
+
+
+def verify_entry(rom, rom_file, entry, output_folder, tlut_cache):
+    """Returnerar en resultat-dict för en Exp-post"""
+    fmt = entry['format'].upper()
+    if fmt == 'RGBA3':
+        fmt = 'RGBA16'
+    width, height = entry['width'], entry['height']
+    png_path = os.path.join(output_folder, entry['dir'], f"{entry['name']}.png")
+    result = {
+        'dir': entry['dir'],
+        'name': entry['name'],
+        'address': entry['address'],
+        'format': fmt,
+        'status': 'ok',
+    }
+
+    if not os.path.exists(png_path):
+        result['status'] = 'saknas'
+        return result
+
+    palette = None
+    if fmt in ['CI4', 'CI8']:
+        if entry['tlut'] is None:
+            result['status'] = 'fel'
+            result['error'] = f"{fmt} kräver en palett (Set Tlut)"
+            return result
+        palette = load_tlut(rom_file, entry['tlut'][0], tlut_size(fmt), entry['tlut'][1], tlut_cache, rom)
+
+    with matning.stage('read'):
+        rom_bytes = rom.read(entry['address'], texture_byte_size(fmt, width, height))
+    with matning.stage('png_read'):
+        image = Image.open(png_path).convert(injection_pil_mode(fmt)).resize((width, height))
+        img_array = np.array(image)
+    with matning.stage('encode'):
+        # Som vid injektering behåller CI-pixlar ROM:ens index när färgen stämmer
+        encoded = bytes(encode_from_png_array(img_array, fmt, palette, rom_bytes))
+    matning.count('textures_verified')
+
+    if encoded == rom_bytes:
+        return result
+
+    byte_diff = int(np.count_nonzero(
+        np.frombuffer(encoded, dtype=np.uint8) != np.frombuffer(rom_bytes, dtype=np.uint8)))
+    pixel_diff = pixel_diff_count(rom_bytes, encoded, width, height, fmt, palette)
+    # Olika index med samma palettfärg ger samma bild i spelet
+    if pixel_diff == 0:
+        return result
+
+    result['status'] = 'skiljer'
+    result['byte_diff'] = byte_diff
+    result['pixel_diff'] = pixel_diff
+    return result
+
+
+@matning.profiled
+def verify(settings_path, rom_file, output_folder):
+    """Verifierar hela settings-filen i ett svep och returnerar alla resultat"""
+    results = []
+    tlut_cache = {}
+    with RomView(rom_file) as rom:
+        for entry in parse_settings_entries(settings_path):
+            try:
+                results.append(verify_entry(rom, rom_file, entry, output_folder, tlut_cache))
+            except Exception as e:
+                results.append({'dir': entry['dir'], 'name': entry['name'], 'address': entry['address'],
+                                'format': entry['format'], 'status': 'fel', 'error': str(e)})
+    return results
+
+
+def print_report(results):
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        if result['status'] == 'skiljer':
+            print(f"✗ {result['dir']}/{result['name']} ({result['format']} @ {result['address']:X}): "
+                  f"{result['pixel_diff']} pixlar, {result['byte_diff']} byte skiljer")
+        elif result['status'] == 'fel':
+            print(f"✗ {result['dir']}/{result['name']}: {result['error']}")
+
+    print(f"\nTotalt: {len(results)}, stämmer: {counts.get('ok', 0)}, skiljer: {counts.get('skiljer', 0)}, "
+          f"saknas: {counts.get('saknas', 0)}, fel: {counts.get('fel', 0)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jämför PNG-filerna i utdatamappen mot ROM:en")
+    parser.add_argument('settings', help="settings-fil, t.ex. 'PAL v1.0.txt'")
+    parser.add_argument('rom', help="ROM-fil att verifiera")
+    parser.add_argument('mapp', help="utdatamappen med PNG-filer")
+    parser.add_argument('--json', help="spara resultatet som JSON")
+    parser.add_argument('--saknade-fel', action='store_true', help="räkna saknade PNG-filer som fel")
+    matning.add_arguments(parser)
+    args = parser.parse_args()
+    matning.enable_from_args(args)
+
+    results = verify(args.settings, args.rom, args.mapp)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultat sparat: {args.json}")
+
+    failing = {'skiljer', 'fel'} | ({'saknas'} if args.saknade_fel else set())
+    sys.exit(1 if any(r['status'] in failing for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()